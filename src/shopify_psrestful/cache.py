@@ -0,0 +1,154 @@
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+
+import httpx
+
+from . import settings
+
+logger = logging.getLogger('ps')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    headers TEXT NOT NULL,
+    content BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+'''
+
+VALIDATOR_HEADERS = ('etag', 'last-modified', 'content-type')
+
+
+class ResponseCache:
+    """
+    On-disk cache of successful GET responses, size bounded with LRU eviction.
+    A response is served without a request while younger than the endpoint TTL, afterwards it is revalidated with
+    If-None-Match/If-Modified-Since when the API sent an ETag/Last-Modified. Recently used responses are kept in memory
+    too, so the pydantic models parsed from them are reused (see APIHelper.gen_product_response).
+    Lookups served from memory don't touch the file: access and 304 refresh times are written once flush_every
+    responses were used, and on put/close.
+    """
+
+    def __init__(self, path: str = settings.PS_CACHE_PATH, max_bytes: int = settings.PS_CACHE_MAX_BYTES,
+                 ttls: dict[str, int] = None, memory_items: int = 256, excluded: set[str] = None,
+                 flush_every: int = settings.PS_CACHE_FLUSH_EVERY):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self.max_bytes = max_bytes
+        self.ttls = settings.PS_CACHE_TTLS if ttls is None else ttls
+        self.excluded = settings.PS_CACHE_EXCLUDED if excluded is None else excluded
+        self.memory = OrderedDict()
+        self.memory_items = memory_items
+        self.flush_every = flush_every
+        self.accessed: dict[str, float] = {}  # key -> accessed_at not yet written
+        self.refreshed: dict[str, float] = {}  # key -> stored_at not yet written
+
+    @staticmethod
+    def gen_key(url: str, qry_params: dict) -> str:
+        return url + '?' + '&'.join(f'{k}={v}' for k, v in sorted(qry_params.items()))
+
+    def get_ttl(self, endpoint: str) -> int:
+        return self.ttls.get(endpoint, self.ttls.get('default', 0))
+
+    def is_cacheable(self, endpoint: str) -> bool:
+        return endpoint not in self.excluded
+
+    def get(self, key: str, ttl: int) -> tuple[httpx.Response | None, bool]:
+        """
+        Returns the cached response, if any, and whether it is still fresh
+        """
+        response = self.memory.get(key)
+        if response is None:
+            row = self.conn.execute('SELECT headers, content, stored_at FROM responses WHERE key = ?',
+                                    (key,)).fetchone()
+            if row is None:
+                return None, False
+            headers, content, stored_at = row
+            stored_at = self.refreshed.get(key, stored_at)
+            response = httpx.Response(200, headers=json.loads(headers), content=content,
+                                      request=httpx.Request('GET', key), extensions={'stored_at': stored_at})
+        self.remember(key, response)
+        self.touch(key)
+        return response, time.time() - response.extensions['stored_at'] < ttl
+
+    @staticmethod
+    def conditional_headers(response: httpx.Response) -> dict:
+        ret = {}
+        if response.headers.get('etag'):
+            ret['If-None-Match'] = response.headers['etag']
+        if response.headers.get('last-modified'):
+            ret['If-Modified-Since'] = response.headers['last-modified']
+        return ret
+
+    def put(self, key: str, response: httpx.Response, ttl: int):
+        validators = {k: v for k, v in response.headers.items() if k.lower() in VALIDATOR_HEADERS}
+        if response.status_code != 200 or not (ttl or 'etag' in validators or 'last-modified' in validators):
+            return
+        now = time.time()
+        self.accessed.pop(key, None)
+        self.refreshed.pop(key, None)
+        self.conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                          (key, json.dumps(validators), response.content, len(response.content), now, now))
+        self.flush()
+        response.extensions['stored_at'] = now
+        self.remember(key, response)
+        self.evict()
+
+    def refresh(self, key: str):
+        """
+        The API answered 304 Not Modified, the cached response is fresh again
+        """
+        now = time.time()
+        self.refreshed[key] = now
+        if key in self.memory:
+            self.memory[key].extensions['stored_at'] = now
+        self.touch(key)
+
+    def touch(self, key: str):
+        self.accessed[key] = time.time()
+        if len(self.accessed) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the pending access and refresh times, and whatever else is uncommitted
+        """
+        self.conn.executemany('UPDATE responses SET accessed_at = ? WHERE key = ?',
+                              [(accessed_at, key) for key, accessed_at in self.accessed.items()])
+        self.conn.executemany('UPDATE responses SET stored_at = ? WHERE key = ?',
+                              [(stored_at, key) for key, stored_at in self.refreshed.items()])
+        self.conn.commit()
+        self.accessed.clear()
+        self.refreshed.clear()
+
+    def remember(self, key: str, response: httpx.Response):
+        self.memory[key] = response
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def evict(self):
+        total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.conn.execute('SELECT key, size FROM responses ORDER BY accessed_at').fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+            self.memory.pop(key, None)
+        self.conn.executemany('DELETE FROM responses WHERE key = ?', evicted)
+        self.conn.commit()
+        logger.info(f'Response cache evicted {len(evicted)} entries')
+
+    def close(self):
+        self.flush()
+        self.conn.close()
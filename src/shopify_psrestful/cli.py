@@ -4,8 +4,11 @@ import logging
 
 from dotenv import load_dotenv
 
+from shopify_psrestful.export import CatalogExporter
 from shopify_psrestful.inventory import InventoryService
 from shopify_psrestful.metafields import create_meta_fields_from_specs
+from shopify_psrestful.scheduler import InventoryScheduler
+from shopify_psrestful.shipments import ShipmentSync
 from shopify_psrestful import settings
 
 
@@ -29,7 +32,14 @@ def main():
     parser = argparse.ArgumentParser(description="Shopify PSRESTful CLI")
 
     parser.add_argument("-c", "--cmd", type=str,
-                        required=True, help="Commands available: add-ps-metafields, update-inventory")
+                        required=True, help="Commands available: add-ps-metafields, update-inventory, "
+                                            "inventory-daemon, export-catalog, sync-shipments")
+    parser.add_argument("--full-crawl", action="store_true",
+                        help="Rebuild the SKU index from the whole Shopify catalog (update-inventory)")
+    parser.add_argument("-s", "--suppliers", type=str, help="Comma separated supplier codes (export-catalog)")
+    parser.add_argument("-o", "--output", type=str, default=settings.EXPORT_DIR,
+                        help="Snapshot directory (export-catalog)")
+    parser.add_argument("-m", "--max-products", type=int, help="Max products per supplier (export-catalog)")
 
     args = parser.parse_args()
     cms = args.cmd.lower()
@@ -39,8 +49,19 @@ def main():
         create_meta_fields_from_specs(shopify_domain, token)
         print("Metafields created successfully.")
     elif cms == 'update-inventory':
-        InventoryService().update_inventory()
+        InventoryService(full_crawl=args.full_crawl).update_inventory()
         print("Updating inventory...")
+    elif cms == 'inventory-daemon':
+        InventoryScheduler().run()
+    elif cms == 'export-catalog':
+        if not args.suppliers:
+            parser.error("export-catalog requires --suppliers")
+        supplier_codes = [code.strip() for code in args.suppliers.split(',') if code.strip()]
+        paths = CatalogExporter(args.output).export(supplier_codes, max_products=args.max_products)
+        print(f"Catalog exported to: {', '.join(paths)}")
+    elif cms == 'sync-shipments':
+        ShipmentSync().sync()
+        print("Shipments synced.")
     else:
         print("Unknown command.")
 
@@ -92,6 +92,7 @@ class APIParams:
     body_params: dict = None
     headers: dict = None
     product_ids_only: bool = False
+    max_age: int = None  # seconds a cached response can be reused without revalidation, the endpoint TTL if None
 
 
 ProductResponse = ProductResponseV100 | ProductResponseV200
@@ -0,0 +1,110 @@
+import gzip
+import json
+import logging
+import os
+import shutil
+from datetime import datetime, timezone
+
+from .ps_client import PSClient
+
+from . import settings
+
+logger = logging.getLogger('ps')
+
+
+class JsonLinesWriter:
+    """
+    Gzipped JSON lines file written in chunks, so memory stays bounded by chunk_size lines
+    """
+
+    def __init__(self, path: str, chunk_size: int = settings.EXPORT_CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.buffer = []
+        self.count = 0
+        self.file = gzip.open(path, 'wt', encoding='utf-8')
+
+    def write(self, line: str):
+        self.buffer.append(line)
+        self.count += 1
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write('\n'.join(self.buffer) + '\n')
+            self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CatalogExporter:
+    """
+    Streams products, parts and inventory from PSRESTful into a local snapshot partitioned by supplier and run:
+        <output_dir>/supplier=<code>/run=<timestamp>/{products,parts,inventory}.jsonl.gz
+    A run is written into a hidden .run=<timestamp>.tmp directory and renamed once complete, so any run= directory
+    holds a finished snapshot.
+    """
+
+    def __init__(self, output_dir: str = settings.EXPORT_DIR, with_inventory: bool = True, client: PSClient = None):
+        self.client = client or PSClient()
+        self.output_dir = output_dir
+        self.with_inventory = with_inventory
+
+    def export(self, supplier_codes: list[str], max_products: int = None) -> list[str]:
+        """
+        Returns the snapshot paths of the suppliers exported successfully
+        """
+        run = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        paths = []
+        for supplier_code in supplier_codes:
+            supplier_dir = os.path.join(self.output_dir, f'supplier={supplier_code}')
+            tmp_path = os.path.join(supplier_dir, f'.run={run}.tmp')
+            try:
+                self.export_supplier(supplier_code, tmp_path, max_products)
+            except Exception as e:  # noqa
+                logger.error(f'{supplier_code} - Error exporting catalog: {e}')
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                continue
+            path = os.path.join(supplier_dir, f'run={run}')
+            os.rename(tmp_path, path)
+            paths.append(path)
+        return paths
+
+    def export_supplier(self, supplier_code: str, path: str, max_products: int = None):
+        os.makedirs(path, exist_ok=True)
+        if max_products is None:
+            max_products = float('inf')
+        with JsonLinesWriter(os.path.join(path, 'products.jsonl.gz')) as products, \
+                JsonLinesWriter(os.path.join(path, 'parts.jsonl.gz')) as parts, \
+                JsonLinesWriter(os.path.join(path, 'inventory.jsonl.gz')) as inventory:
+            for product in self.client.get_products(supplier_code, None, [], max_products=max_products):
+                data = product.model_dump(mode='json', exclude_none=True)
+                products.write(json.dumps(data))
+                product_data = data.get('Product') or {}
+                product_id = product_data.get('productId')
+                for part in (product_data.get('ProductPartArray') or {}).get('ProductPart') or []:
+                    parts.write(json.dumps({'supplier_code': supplier_code, 'product_id': product_id, **part}))
+                if self.with_inventory:
+                    self.export_inventory(inventory, supplier_code, product_id)
+            logger.info(f'{supplier_code} - exported {products.count} products, {parts.count} parts and '
+                        f'{inventory.count} inventory records')
+
+    def export_inventory(self, writer: JsonLinesWriter, supplier_code: str, product_id: str):
+        try:
+            inv_resp = self.client.get_inventory(supplier_code, product_id)
+            if not inv_resp.is_ok:
+                logger.warning(f'Inventory not available for {supplier_code}-{product_id}')
+                return
+            data = inv_resp.model_dump(mode='json', exclude_none=True)
+            writer.write(json.dumps({'supplier_code': supplier_code, 'product_id': product_id, **data}))
+        except Exception as e:  # noqa
+            logger.error(f'Error getting inventory for {supplier_code}-{product_id}: {e}')
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import logging
+import sqlite3
+from typing import Iterable, Iterator
+
+from .domain import ProductResponse
+
+from . import settings
+
+logger = logging.getLogger('ps')
+
+# fields that change without the product content changing
+VOLATILE_FIELDS = {'lastChangeDate', 'creationDate'}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS fingerprints (
+    supplier_code TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    store TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    PRIMARY KEY (supplier_code, product_id, store)
+);
+'''
+
+
+def product_fingerprint(product: ProductResponse) -> str:
+    """
+    Stable hash of the product content of a v1.0.0 or v2.0.0 response. The two versions dump different fields, so a
+    supplier moving to another version gets every product rewritten once.
+    """
+    data = product.model_dump(mode='json', exclude_none=True).get('Product') or {}
+    data = {k: v for k, v in data.items() if k not in VOLATILE_FIELDS}
+    content = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
+class FingerprintStore:
+    """
+    Last fingerprint written per (supplier_code, product_id, store), store being the Shopify shop url
+    """
+
+    def __init__(self, path: str = settings.FINGERPRINTS_PATH):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def get(self, supplier_code: str, product_id: str, store: str = None) -> str | None:
+        row = self.conn.execute('SELECT fingerprint FROM fingerprints WHERE supplier_code = ? AND product_id = ? '
+                                'AND store = ?', (supplier_code, product_id, get_store(store))).fetchone()
+        return row[0] if row else None
+
+    def save(self, supplier_code: str, product_id: str, fingerprint: str, store: str = None):
+        self.conn.execute('INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?)',
+                          (supplier_code, product_id, get_store(store), fingerprint))
+        self.conn.commit()
+
+    def only_changed(self, products: Iterable[ProductResponse], supplier_code: str,
+                     store: str = None) -> Iterator[tuple[ProductResponse, str]]:
+        """
+        Filters a product stream like PSClient.get_products down to the products changed since their last write.
+        Yields (product, fingerprint); call save once the product was written to the store.
+        """
+        store = get_store(store)
+        skipped = 0
+        for product in products:
+            fingerprint = product_fingerprint(product)
+            if self.get(supplier_code, product.data.productId, store) == fingerprint:
+                skipped += 1
+                continue
+            yield product, fingerprint
+        logger.info(f'{supplier_code} - {skipped} unchanged products skipped')
+
+    def close(self):
+        self.conn.close()
+
+
+def get_store(store: str | None) -> str:
+    store = store or settings.SHOPIFY_APP_SHOP_URL
+    if not store:
+        raise ValueError('No store given and SHOPIFY_APP_SHOP_URL is not set')
+    return store
@@ -6,9 +6,8 @@ from tenacity import retry, stop_after_attempt, wait_fixed
 
 
 from .client import get_shopify_session
-from .products import get_all_shopify_products
-from .metafields import get_supplier_and_product_id
 from .ps_client import PSClient
+from .sku_index import SkuIndex, IndexedVariant
 from .domain import InventoryLevelsResponse
 
 
@@ -19,8 +18,10 @@ logger = logging.getLogger('shopify')
 
 class InventoryService:
 
-    def __init__(self):
+    def __init__(self, full_crawl: bool = False):
         self.client = PSClient()
+        self.sku_index = SkuIndex()
+        self.full_crawl = full_crawl
 
     def update_inventory(self, shopify_domain: str = settings.SHOPIFY_APP_SHOP_URL,
                          token: str = settings.SHOPIFY_APP_PRIVATE_APP_PASSWORD):
@@ -35,25 +36,32 @@ class InventoryService:
         return locations[0].id
 
     def _update_inventory(self, location_id):
-        for ix, product in enumerate(get_all_shopify_products()):
-            logger.info(f'Processing product {ix} - {product.title}')
-            supplier_code, product_id = get_supplier_and_product_id(product)
-            if not supplier_code or not product_id:
-                logger.error(f'Product {product.title} has no supplier code or product id')
-                continue
+        self.sku_index.refresh(full=self.full_crawl)
+        for ix, ((supplier_code, product_id), variants) in enumerate(self.sku_index.products().items()):
+            product_str = f'{supplier_code}-{product_id}'
+            logger.info(f'Processing product {ix} - {product_str}')
             try:
-                inv_resp = self.client.get_inventory(supplier_code, product_id)
-                if inv_resp.is_ok:
-                    for variant in product.variants:
-                        self.update_variant_inventory(inv_resp, location_id, variant)
+                self.update_product_inventory(supplier_code, product_id, variants, location_id)
             except Exception as e:  # noqa
-                logger.error(f'Error processing product {product.title}: {e}')
+                logger.error(f'Error processing product {product_str}: {e}')
                 continue
 
+    def update_product_inventory(self, supplier_code: str, product_id: str, variants: list[IndexedVariant],
+                                 location_id, max_age: int = None) -> dict[str, int]:
+        """
+        Pushes the supplier inventory of one product to its Shopify variants, returns the levels set by sku
+        """
+        levels = {}
+        inv_resp = self.client.get_inventory(supplier_code, product_id, max_age=max_age)
+        if inv_resp.is_ok:
+            for variant in variants:
+                levels[variant.sku] = self.update_variant_inventory(inv_resp, location_id, variant)
+        return levels
+
     @staticmethod
     @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
-    def update_variant_inventory(inv_resp: InventoryLevelsResponse, location_id, variant):
-        part_id = variant.attributes['sku']
+    def update_variant_inventory(inv_resp: InventoryLevelsResponse, location_id, variant: IndexedVariant):
+        part_id = variant.sku
         available_inventory = inv_resp.get_available_inventory(part_id)
         available_inventory = int(available_inventory) if available_inventory else 0
         logger.info(f'Processing variant {part_id} -> {available_inventory}')
@@ -62,3 +70,4 @@ class InventoryService:
                                                      inventory_item_id=inventory_item_id,
                                                      available=available_inventory)
         logger.info(f"Updated inventory level: {inventory_level}")
+        return available_inventory
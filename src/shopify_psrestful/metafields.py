@@ -69,6 +69,10 @@ SPECS = (
     # Variant
     Spec(name='Variant GTIN', key='variant_gtin', description='Global Trade Item Number',
          field_type='single_line_text_field', owner_type='ProductVariant'),
+    # Order
+    Spec(name='Purchase Orders', key='purchase_orders',
+         description='Supplier PO numbers of this order as a JSON object of supplier code -> PO number',
+         field_type='json', owner_type='ORDER'),
 )
 
 
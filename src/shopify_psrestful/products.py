@@ -3,14 +3,14 @@ from tenacity import retry, stop_after_attempt, wait_fixed
 import shopify
 
 
-def get_all_shopify_products(limit=200):
+def get_all_shopify_products(limit=200, **filters):
     """
-    Iterator to get all products from Shopify
+    Iterator to get all products from Shopify, filters like updated_at_min are passed through to the API
     """
     get_next_page = True
     since_id = 0
     while get_next_page:
-        products = get_shopify_products(since_id=since_id, limit=limit)
+        products = get_shopify_products(since_id=since_id, limit=limit, **filters)
 
         for product in products:
             yield product
@@ -21,6 +21,6 @@ def get_all_shopify_products(limit=200):
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
-def get_shopify_products(since_id=0, limit=100):
+def get_shopify_products(since_id=0, limit=100, **filters):
     # allows to retry when 429 error is raised
-    return shopify.Product.find(since_id=since_id, limit=limit)
+    return shopify.Product.find(since_id=since_id, limit=limit, **filters)
@@ -9,6 +9,7 @@ import httpx
 
 from . import settings
 
+from .cache import ResponseCache
 from .domain import APIParams, ServiceVersion, ServiceCode, Environment, Function, ProductResponse, \
     get_product_class, InventoryLevelsResponse, get_inventory_class
 from .ps_services import ServiceHelper
@@ -72,9 +73,9 @@ class PSClient:
                                                            environment=Environment.PROD)
         return response.json()
 
-    def get_inventory(self, supplier_code: str, product_id: str) -> InventoryLevelsResponse:
+    def get_inventory(self, supplier_code: str, product_id: str, max_age: int = None) -> InventoryLevelsResponse:
         response, _, version = self.api.get_inventory(supplier_code, environment=Environment.PROD,
-                                                      headers=self.headers, product_id=product_id)
+                                                      headers=self.headers, product_id=product_id, max_age=max_age)
         if response.status_code == 429:
             msg = f'{supplier_code} - Rate limit reached while getting inventory for product {product_id}'
             logger.warning(msg)
@@ -98,10 +99,13 @@ class PSClient:
 
 
 class APIHelper:
-    def __init__(self, sync: bool = True):
+    def __init__(self, sync: bool = True, cache: ResponseCache = None):
         timeout = 3000
         self.client = httpx.Client(timeout=timeout) if sync else httpx.AsyncClient(timeout=timeout)
         self.service_helper = ServiceHelper()
+        if cache is None and settings.PS_CACHE_PATH:
+            cache = ResponseCache()
+        self.cache = cache
 
     def perform_request(self, params: APIParams, product_id: str = None):
         url = self.gen_url(params, product_id)
@@ -110,7 +114,11 @@ class APIHelper:
         qry_params['environment'] = env if isinstance(env, str) else env.value
         #
         ts = time.monotonic()
-        result = self.client.get(url, params=qry_params, headers=params.headers)
+        key, ttl, cached, fresh = self.get_cached(params, url, qry_params)
+        if fresh:
+            return cached, self.get_duration(time.monotonic() - ts)
+        result = self.client.get(url, params=qry_params, headers=self.gen_headers(params, cached))
+        result = self.update_cache(key, ttl, cached, result)
         te = time.monotonic()
         return result, self.get_duration(te - ts)
 
@@ -121,10 +129,40 @@ class APIHelper:
         qry_params['environment'] = env if isinstance(env, str) else env.value
 
         ts = time.monotonic()
-        result = await self.client.get(url, params=qry_params, headers=params.headers)
+        key, ttl, cached, fresh = self.get_cached(params, url, qry_params)
+        if fresh:
+            return cached, self.get_duration(time.monotonic() - ts)
+        result = await self.client.get(url, params=qry_params, headers=self.gen_headers(params, cached))
+        result = self.update_cache(key, ttl, cached, result)
         te = time.monotonic()
         return result, self.get_duration(te - ts)
 
+    def get_cached(self, params: APIParams, url: str, qry_params: dict):
+        """
+        Returns key, ttl, cached response and whether it is fresh enough to skip the request
+        """
+        endpoint = self.gen_srv_func(params.service, params.function, params.product_ids_only)
+        if self.cache is None or not self.cache.is_cacheable(endpoint):
+            return None, 0, None, False
+        ttl = self.cache.get_ttl(endpoint)
+        key = self.cache.gen_key(url, qry_params)
+        cached, fresh = self.cache.get(key, ttl if params.max_age is None else min(ttl, params.max_age))
+        return key, ttl, cached, fresh
+
+    def gen_headers(self, params: APIParams, cached: httpx.Response | None) -> dict | None:
+        if cached is None:
+            return params.headers
+        return {**(params.headers or {}), **self.cache.conditional_headers(cached)}
+
+    def update_cache(self, key: str, ttl: int, cached: httpx.Response | None, result: httpx.Response):
+        if key is None:
+            return result
+        if result.status_code == 304 and cached is not None:
+            self.cache.refresh(key)
+            return cached
+        self.cache.put(key, result, ttl)
+        return result
+
     def gen_qry_params(self, params: APIParams):
         ret = params.query_params or {}
         new_ret = {k: v for k, v in ret.items() if v}
@@ -252,6 +290,14 @@ class APIHelper:
             raise ValueError(f'No inventory version found for supplier {supplier_code}')
         return version
 
+    def get_latest_osn_version(self, supplier_code, version) -> ServiceVersion | None:
+        if version is None:
+            api_version = self.service_helper.get_latest_code(supplier_code, 'OSN')
+            version = ServiceVersion('v' + api_version) if api_version else None
+        if version is None:
+            raise ValueError(f'No order shipment notification version found for supplier {supplier_code}')
+        return version
+
     def get_product_detail(self, supplier_code: str, environment: Environment, headers: dict,
                            product_id: str, version: ServiceVersion = None):
         version = self.get_latest_product_data_version(supplier_code, version)
@@ -270,9 +316,11 @@ class APIHelper:
         return await self.a_perform_request(params, product_id=product_id)
 
     def get_inventory(self, supplier_code: str, environment: Environment, headers: dict,
-                      product_id: str, version: ServiceVersion = None, filter_type=None, filter_value=None):
+                      product_id: str, version: ServiceVersion = None, filter_type=None, filter_value=None,
+                      max_age: int = None):
         params, version = self._get_inventory_common(environment, supplier_code, version,
                                                      filter_type, filter_value, headers)
+        params.max_age = max_age
         resp, duration = self.perform_request(params, product_id=product_id)
         return resp, duration, version
 
@@ -283,6 +331,25 @@ class APIHelper:
         resp, duration = self.a_perform_request(params, product_id=product_id)
         return resp, duration, version
 
+    def get_order_shipment_notifications(self, supplier_code: str, environment: Environment, headers: dict,
+                                         query_params: dict, version: ServiceVersion = None):
+        params, version = self._get_osn_common(environment, supplier_code, version, query_params, headers)
+        resp, duration = self.perform_request(params)
+        return resp, duration, version
+
+    async def a_get_order_shipment_notifications(self, supplier_code: str, environment: Environment, headers: dict,
+                                                 query_params: dict, version: ServiceVersion = None):
+        params, version = self._get_osn_common(environment, supplier_code, version, query_params, headers)
+        resp, duration = await self.a_perform_request(params)
+        return resp, duration, version
+
+    def _get_osn_common(self, environment, supplier_code, version, query_params, headers):
+        version = self.get_latest_osn_version(supplier_code, version)
+        params = APIParams(supplier_code=supplier_code, version=version, headers=headers, environment=environment,
+                           service=ServiceCode.OSN, function=Function.GetOrderShipmentNotification,
+                           query_params=query_params)
+        return params, version
+
     def _get_inventory_common(self, environment, supplier_code, version, filter_type, filter_value, headers):
         version = self.get_latest_inventory_version(supplier_code, version)
         if version is None:
@@ -300,12 +367,25 @@ class APIHelper:
     @staticmethod
     def gen_product_response(response, version: ServiceVersion) -> ProductResponse:
         cls = get_product_class(version)
-        return cls.model_validate_json(response.content)
+        return APIHelper.parse_response(response, cls)
 
     @staticmethod
     def gen_inventory_response(response, version: ServiceVersion) -> InventoryLevelsResponse:
         cls = get_inventory_class(version)
         if response.status_code == 200:
-            return cls.model_validate_json(response.content)
+            return APIHelper.parse_response(response, cls)
         logger.error(f'Failed to get inventory response for supplier code {response.request.method} ')
         raise Exception(response.content)
+
+    @staticmethod
+    def parse_response(response, cls):
+        """
+        Models parsed from cached responses are kept on the response, so cache hits skip the parsing too
+        """
+        model = response.extensions.get('model')
+        if isinstance(model, cls):
+            return model
+        model = cls.model_validate_json(response.content)
+        if 'stored_at' in response.extensions:
+            response.extensions['model'] = model
+        return model
@@ -0,0 +1,197 @@
+import heapq
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from .client import get_shopify_session
+from .inventory import InventoryService
+
+from . import settings
+
+logger = logging.getLogger('shopify')
+
+
+@dataclass
+class RefreshState:
+    supplier_code: str
+    product_id: str
+    variants: list = field(default_factory=list)
+    interval: float = settings.SCHEDULER_INITIAL_INTERVAL
+    due: float = 0.0
+    levels: dict = field(default_factory=dict)
+
+    @property
+    def key(self) -> tuple[str, str]:
+        return self.supplier_code, self.product_id
+
+
+class InventoryScheduler:
+    """
+    Long-running inventory refresh: keeps the Shopify session, the PS client and the location warm and refreshes
+    every (supplier, product) key on its own interval. The interval shrinks when a refresh changes quantities or the
+    total stock drops low and grows when nothing changed, so dormant products end up refreshed about once a day.
+    """
+
+    def __init__(self, min_interval: float = settings.SCHEDULER_MIN_INTERVAL,
+                 max_interval: float = settings.SCHEDULER_MAX_INTERVAL,
+                 initial_interval: float = settings.SCHEDULER_INITIAL_INTERVAL,
+                 low_stock: int = settings.SCHEDULER_LOW_STOCK, service: InventoryService = None):
+        self.service = service or InventoryService()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.initial_interval = initial_interval
+        self.low_stock = low_stock
+        self.states: dict[tuple[str, str], RefreshState] = {}
+        self.queue: list[tuple[float, int, tuple[str, str]]] = []
+        self.seq = 0
+        self.cond = threading.Condition()
+        self.stopped = False
+        self.location_id = None
+        self.index_loaded_at = 0.0
+
+    def run(self, shopify_domain: str = settings.SHOPIFY_APP_SHOP_URL,
+            token: str = settings.SHOPIFY_APP_PRIVATE_APP_PASSWORD,
+            host: str = settings.SCHEDULER_HOST, port: int = settings.SCHEDULER_PORT):
+        with get_shopify_session(shopify_domain, token):
+            self.location_id = self.service.get_default_location_id()
+            self.load_products()
+            server = self.start_server(host, port)
+            try:
+                self.loop()
+            finally:
+                server.shutdown()
+
+    def load_products(self):
+        self.service.sku_index.refresh()
+        now = self.index_loaded_at = time.monotonic()
+        products = self.service.sku_index.products()
+        with self.cond:
+            for key in set(self.states) - set(products):  # pruned from the index, their queue entries go stale
+                del self.states[key]
+        new_keys = [key for key in products if key not in self.states]
+        for ix, (supplier_code, product_id) in enumerate(new_keys):
+            state = RefreshState(supplier_code, product_id, interval=self.initial_interval)
+            self.states[state.key] = state
+            # spread over the initial interval instead of refreshing the whole catalog at once
+            self.schedule(state, now + self.initial_interval * ix / len(new_keys))
+        for key, variants in products.items():
+            self.states[key].variants = variants
+        logger.info(f'Scheduler loaded {len(self.states)} products')
+
+    def schedule(self, state: RefreshState, due: float):
+        with self.cond:
+            state.due = due
+            self.seq += 1
+            heapq.heappush(self.queue, (due, self.seq, state.key))
+            self.cond.notify()
+
+    def request_refresh(self, supplier_code: str, product_id: str) -> bool:
+        """
+        Ad-hoc refresh, the product jumps to the front of the queue
+        """
+        state = self.states.get((supplier_code, product_id))
+        if state is None:
+            return False
+        self.schedule(state, time.monotonic())
+        return True
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+
+    def next_due(self) -> RefreshState | None:
+        with self.cond:
+            while not self.stopped:
+                if not self.queue:
+                    self.cond.wait()
+                    continue
+                due, _, key = self.queue[0]
+                state = self.states.get(key)
+                if state is None or due != state.due:  # removed or rescheduled, stale entry
+                    heapq.heappop(self.queue)
+                    continue
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self.cond.wait(wait)
+                    continue
+                heapq.heappop(self.queue)
+                return state
+        return None
+
+    def loop(self):
+        while (state := self.next_due()) is not None:
+            if time.monotonic() - self.index_loaded_at > settings.SKU_INDEX_REFRESH_INTERVAL:
+                self.load_products()  # picks up products added, changed or deleted in Shopify
+                if state.key not in self.states:
+                    continue
+            due = state.due
+            try:
+                # max_age=0, a cached response is only reused after the API confirms it did not change
+                levels = self.service.update_product_inventory(state.supplier_code, state.product_id,
+                                                               state.variants, self.location_id, max_age=0)
+                state.interval = self.next_interval(state, levels)
+                state.levels = levels
+            except Exception as e:  # noqa
+                logger.error(f'Error refreshing {state.supplier_code}-{state.product_id}: {e}')
+            if state.due == due:  # otherwise an ad-hoc refresh came in meanwhile and is already queued
+                logger.info(f'Next refresh of {state.supplier_code}-{state.product_id} in {state.interval:.0f}s')
+                self.schedule(state, time.monotonic() + state.interval)
+
+    def next_interval(self, state: RefreshState, levels: dict[str, int]) -> float:
+        """
+        Low stock is the product total, and only while it is falling: sold out or unreported variants stay at 0
+        and must not keep the whole product on the min interval
+        """
+        total = sum(levels.values())
+        if state.levels and total < sum(state.levels.values()) and total <= self.low_stock:
+            return self.min_interval
+        if not state.levels:  # first refresh, nothing to compare with
+            interval = state.interval
+        elif levels != state.levels:
+            interval = state.interval / 2
+        else:
+            interval = state.interval * 1.5
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def start_server(self, host: str, port: int) -> ThreadingHTTPServer:
+        scheduler = self
+
+        class RefreshHandler(BaseHTTPRequestHandler):
+            def do_POST(self):  # noqa
+                url = urlparse(self.path)
+                if url.path != '/refresh':
+                    return self.reply(404, {'error': 'Not found'})
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                    body = json.loads(self.rfile.read(length)) if length else {}
+                except ValueError:
+                    return self.reply(400, {'error': 'Invalid JSON body'})
+                if not isinstance(body, dict):
+                    return self.reply(400, {'error': 'The JSON body must be an object'})
+                params.update(body)
+                supplier_code, product_id = params.get('supplier_code'), params.get('product_id')
+                if not supplier_code or not product_id:
+                    return self.reply(400, {'error': 'supplier_code and product_id are required'})
+                if not scheduler.request_refresh(supplier_code, product_id):
+                    return self.reply(404, {'error': f'Unknown product {supplier_code}-{product_id}'})
+                return self.reply(202, {'queued': f'{supplier_code}-{product_id}'})
+
+            def reply(self, status: int, body: dict):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps(body).encode())
+
+            def log_message(self, format, *args):  # noqa
+                logger.info(f'Refresh request: {format % args}')
+
+        server = ThreadingHTTPServer((host, port), RefreshHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logger.info(f'Listening for refresh requests on http://{host}:{port}/refresh')
+        return server
@@ -1,3 +1,4 @@
+import json
 import os
 
 
@@ -10,3 +11,48 @@ SHOPIFY_API_VERSION = os.getenv('SHOPIFY_API_VERSION', '2024-07')
 #
 PS_RESTFUL_API_KEY = os.getenv('PS_RESTFUL_API_KEY')
 PS_REST_API = os.getenv('PS_REST_API', 'https://api.psrestful.com/')
+#
+SCHEDULER_HOST = os.getenv('SCHEDULER_HOST', '127.0.0.1')
+SCHEDULER_PORT = int(os.getenv('SCHEDULER_PORT', '8765'))
+SCHEDULER_MIN_INTERVAL = int(os.getenv('SCHEDULER_MIN_INTERVAL', '300'))  # seconds, fast-moving / low-stock items
+SCHEDULER_MAX_INTERVAL = int(os.getenv('SCHEDULER_MAX_INTERVAL', '86400'))  # seconds, dormant items
+# seconds, new items start here and their first refresh is spread over it
+SCHEDULER_INITIAL_INTERVAL = int(os.getenv('SCHEDULER_INITIAL_INTERVAL', '3600'))
+SCHEDULER_LOW_STOCK = int(os.getenv('SCHEDULER_LOW_STOCK', '50'))
+#
+EXPORT_DIR = os.getenv('EXPORT_DIR', 'snapshots')
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '500'))  # lines buffered before each write
+#
+SKU_INDEX_PATH = os.getenv('SKU_INDEX_PATH', 'sku_index.sqlite3')
+# seconds between full crawls, picking up newly tagged products and dropping deleted ones
+SKU_INDEX_FULL_CRAWL_INTERVAL = int(os.getenv('SKU_INDEX_FULL_CRAWL_INTERVAL', '86400'))
+SKU_INDEX_REFRESH_INTERVAL = int(os.getenv('SKU_INDEX_REFRESH_INTERVAL', '3600'))  # seconds, inventory-daemon
+#
+# last OSN poll and pending shipments per supplier
+SHIPMENTS_STATE_PATH = os.getenv('SHIPMENTS_STATE_PATH', 'shipments_since.json')
+SHIPMENTS_PENDING_DAYS = int(os.getenv('SHIPMENTS_PENDING_DAYS', '14'))  # unmatched shipments are retried this long
+# each poll looks back this far before the previous one, suppliers post shipments late with the ship date
+SHIPMENTS_LOOKBACK_HOURS = int(os.getenv('SHIPMENTS_LOOKBACK_HOURS', '72'))
+SHIPMENTS_INITIAL_SINCE = os.getenv('SHIPMENTS_INITIAL_SINCE', '2024-01-01T00:00:00+00:00')
+SHIPMENTS_NOTIFY_CUSTOMER = os.getenv('SHIPMENTS_NOTIFY_CUSTOMER', 'true').lower() == 'true'
+#
+PS_CACHE_PATH = os.getenv('PS_CACHE_PATH', '')  # response cache file, the cache is disabled when empty
+PS_CACHE_MAX_BYTES = int(os.getenv('PS_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+# seconds a response is served without asking the API again, by endpoint. Endpoints not listed use default
+# inventory is always revalidated, it is only reused when the API answers 304 Not Modified
+PS_CACHE_TTLS = {
+    'sellable-product-ids': 24 * 3600,
+    'sellables': 24 * 3600,
+    'products': 12 * 3600,
+    'inventory': 0,
+    'default': 0,
+    **json.loads(os.getenv('PS_CACHE_TTLS', '{}')),
+}
+# endpoints queried with a timestamp that changes on every call, their responses are never reused
+PS_CACHE_EXCLUDED = set(filter(None, os.getenv(
+    'PS_CACHE_EXCLUDED', 'order-shipment-notifications,order-status,products-modified-since,media-modified-since'
+).split(',')))
+# access times are kept in memory and written to the cache file once that many responses were used
+PS_CACHE_FLUSH_EVERY = int(os.getenv('PS_CACHE_FLUSH_EVERY', '100'))
+#
+FINGERPRINTS_PATH = os.getenv('FINGERPRINTS_PATH', 'fingerprints.sqlite3')
@@ -0,0 +1,372 @@
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
+
+import shopify
+from tenacity import retry, stop_after_attempt, wait_fixed
+
+from .client import get_shopify_session
+from .domain import Environment
+from .ps_client import APIHelper
+
+from . import settings
+
+logger = logging.getLogger('shopify')
+
+OSN_QUERY_TYPE_SINCE = 3  # all shipments since shipmentDateTimeStamp
+OPEN_FULFILLMENT_ORDER_STATUSES = ('OPEN', 'IN_PROGRESS')
+
+OPEN_ORDERS_QUERY = '''
+query OpenOrders($cursor: String) {
+  orders(first: 50, after: $cursor,
+         query: "status:open AND (fulfillment_status:unshipped OR fulfillment_status:partial)") {
+    pageInfo {
+      hasNextPage
+      endCursor
+    }
+    nodes {
+      id
+      name
+      metafield(namespace: "psrestful", key: "purchase_orders") {
+        value
+      }
+      fulfillmentOrders(first: 10) {
+        nodes {
+          id
+          status
+          lineItems(first: 100) {
+            nodes {
+              id
+              remainingQuantity
+              sku
+            }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+
+@dataclass
+class OpenOrder:
+    id: str
+    name: str
+    purchase_orders: dict[str, str]  # supplier_code -> PO number
+    fulfillment_orders: list[dict] = field(default_factory=list)
+
+
+@dataclass
+class Shipment:
+    supplier_code: str
+    po_number: str
+    carrier: str | None
+    tracking_numbers: list[str]
+    items: dict[str, int] = field(default_factory=dict)  # supplier part id (Shopify sku) -> quantity shipped
+    first_seen: str = ''
+
+    @property
+    def key(self) -> tuple[str, str]:
+        return self.supplier_code, self.po_number
+
+
+class ShipmentSync:
+    """
+    Polls supplier Order Shipment Notifications for open Shopify orders and writes tracking back as fulfillments.
+    Order <-> PO link: `psrestful.purchase_orders` order metafield, a JSON object of supplier_code -> PO number.
+    Each supplier is polled once per run for notifications since its previous poll, all suppliers concurrently.
+    Shipments that could not be matched to an open order or written are kept as pending and retried next run.
+    """
+
+    def __init__(self, state_path: str = settings.SHIPMENTS_STATE_PATH):
+        self.api = APIHelper(sync=False)
+        self.headers = {'x-api-key': settings.PS_RESTFUL_API_KEY, 'accept': 'application/json'}
+        self.state_path = state_path
+
+    def sync(self, shopify_domain: str = settings.SHOPIFY_APP_SHOP_URL,
+             token: str = settings.SHOPIFY_APP_PRIVATE_APP_PASSWORD):
+        with get_shopify_session(shopify_domain, token):
+            orders = self.get_open_orders()
+            po_orders = {}
+            for order in orders:
+                for supplier_code, po_number in order.purchase_orders.items():
+                    po_orders[(supplier_code, str(po_number))] = order
+            supplier_codes = sorted({supplier_code for supplier_code, _ in po_orders})
+            logger.info(f'{len(orders)} open orders with POs from {len(supplier_codes)} suppliers')
+            state = self.load_state()
+            polls = asyncio.run(self.poll_suppliers(supplier_codes, state))
+            shipments = [Shipment(**pending) for supplier in state.values() for pending in supplier['pending']]
+            for _, new_shipments in polls.values():
+                shipments.extend(self.drop_known(new_shipments, state))
+            grouped = self.group_shipments(shipments)
+            unhandled = self.fulfill(grouped, po_orders)
+            unhandled_ids = {id(shipment) for shipment in unhandled}
+            handled = [shipment for shipment in grouped if id(shipment) not in unhandled_ids]
+            for supplier_code, (polled_at, _) in polls.items():
+                state.setdefault(supplier_code, {'pending': [], 'handled': {}})['since'] = polled_at
+            self.save_state(state, unhandled, handled)
+            logger.info(f'Shipment sync complete, {len(unhandled)} shipments pending')
+
+    def fulfill(self, shipments: list[Shipment], po_orders: dict[tuple[str, str], OpenOrder]) -> list[Shipment]:
+        """
+        Writes the fulfillments of the shipments matching an open order, returns the shipments left unhandled
+        """
+        unhandled = []
+        fulfillments = []
+        fulfilled = []
+        for shipment in shipments:
+            order = po_orders.get(shipment.key)
+            fulfillment = self.gen_fulfillment(order, shipment) if order else None
+            if fulfillment:
+                fulfillments.append(fulfillment)
+                fulfilled.append(shipment)
+            else:
+                unhandled.append(shipment)
+        failed = self.create_fulfillments(fulfillments)
+        unhandled.extend(fulfilled[ix] for ix in failed)
+        logger.info(f'{len(fulfillments) - len(failed)} fulfillments created')
+        return unhandled
+
+    def get_open_orders(self) -> list[OpenOrder]:
+        orders = []
+        cursor = None
+        while True:
+            try:
+                resp = execute_graphql(OPEN_ORDERS_QUERY, {'cursor': cursor})
+            except Exception as e:  # noqa
+                logger.error(f'Error getting open orders: {e}')
+                return orders
+            data = (resp.get('data') or {}).get('orders')
+            if not data:
+                logger.error(f'Error getting open orders: {resp.get("errors")}')
+                return orders
+            for node in data['nodes']:
+                order = self.gen_open_order(node)
+                if order:
+                    orders.append(order)
+            if not data['pageInfo']['hasNextPage']:
+                return orders
+            cursor = data['pageInfo']['endCursor']
+
+    @staticmethod
+    def gen_open_order(node: dict) -> OpenOrder | None:
+        metafield = node.get('metafield')
+        if not metafield or not metafield.get('value'):
+            return None
+        try:
+            purchase_orders = json.loads(metafield['value'])
+        except ValueError:
+            purchase_orders = None
+        if not isinstance(purchase_orders, dict):
+            logger.error(f'Order {node["name"]} - invalid purchase_orders metafield: {metafield["value"]}')
+            return None
+        fulfillment_orders = [fo for fo in node['fulfillmentOrders']['nodes']
+                              if fo['status'] in OPEN_FULFILLMENT_ORDER_STATUSES]
+        if not fulfillment_orders:
+            return None
+        return OpenOrder(node['id'], node['name'], purchase_orders, fulfillment_orders)
+
+    async def poll_suppliers(self, supplier_codes: list[str], state: dict) -> dict[str, tuple[str, list[Shipment]]]:
+        """
+        Returns polled_at and the new shipments of every supplier polled successfully
+        """
+        results = await asyncio.gather(*[self.poll_supplier(code, state) for code in supplier_codes])
+        return {code: result for code, result in zip(supplier_codes, results) if result is not None}
+
+    async def poll_supplier(self, supplier_code: str, state: dict) -> tuple[str, list[Shipment]] | None:
+        polled_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        last_poll = state.get(supplier_code, {}).get('since') or settings.SHIPMENTS_INITIAL_SINCE
+        # suppliers post shipments late, dated with the ship date: look back so those are not missed
+        lookback = timedelta(hours=settings.SHIPMENTS_LOOKBACK_HOURS)
+        last_poll = (datetime.fromisoformat(last_poll) - lookback).isoformat(timespec='seconds')
+        query_params = {'queryType': OSN_QUERY_TYPE_SINCE, 'shipmentDateTimeStamp': last_poll}
+        try:
+            # the services lookup is blocking, keep it off the event loop so suppliers are polled concurrently
+            version = await asyncio.to_thread(self.api.get_latest_osn_version, supplier_code, None)
+            response, _, _ = await self.api.a_get_order_shipment_notifications(
+                supplier_code, environment=Environment.PROD, headers=self.headers, query_params=query_params,
+                version=version)
+            if response.status_code != 200:
+                raise Exception(response.text)
+            shipments = self.gen_shipments(supplier_code, response.json(), polled_at)
+        except Exception as e:  # noqa
+            logger.error(f'{supplier_code} - Error getting shipment notifications since {last_poll}: {e}')
+            return None
+        logger.info(f'{supplier_code} - {len(shipments)} shipments since {last_poll}')
+        return polled_at, shipments
+
+    @staticmethod
+    def gen_shipments(supplier_code: str, resp: dict, first_seen: str = '') -> list[Shipment]:
+        """
+        One shipment per package, so overlapping polls can be deduplicated by tracking number
+        """
+        error = resp.get('ServiceMessageArray') or resp.get('ErrorMessage')
+        notifications = (resp.get('OrderShipmentNotificationArray') or {}).get('OrderShipmentNotification') or []
+        if error and not notifications:
+            logger.warning(f'{supplier_code} - {error}')
+        ret = []
+        for notification in notifications:
+            po_number = notification.get('purchaseOrderNumber')
+            if not po_number:
+                continue
+            for sales_order in (notification.get('SalesOrderArray') or {}).get('SalesOrder') or []:
+                locations = (sales_order.get('ShipmentLocationArray') or {}).get('ShipmentLocation') or []
+                for location in locations:
+                    for package in (location.get('PackageArray') or {}).get('Package') or []:
+                        if not package.get('trackingNumber'):
+                            continue
+                        shipment = Shipment(supplier_code, str(po_number), package.get('carrier'),
+                                            [package['trackingNumber']], first_seen=first_seen)
+                        for item in (package.get('ItemArray') or {}).get('Item') or []:
+                            part_id = item.get('supplierPartId')
+                            if part_id and item.get('quantity'):
+                                quantity = int(float(item['quantity']))
+                                shipment.items[part_id] = shipment.items.get(part_id, 0) + quantity
+                        ret.append(shipment)
+        return ret
+
+    @staticmethod
+    def drop_known(shipments: list[Shipment], state: dict) -> list[Shipment]:
+        """
+        Polls overlap, drops the packages already fulfilled or pending by (supplier, PO, tracking number)
+        """
+        known = set()
+        for supplier_code, supplier in state.items():
+            known.update((supplier_code, key) for key in supplier.get('handled', {}))
+            for pending in supplier['pending']:
+                known.update((supplier_code, tracking_key(pending['po_number'], number))
+                             for number in pending['tracking_numbers'])
+        return [shipment for shipment in shipments if (shipment.supplier_code,
+                tracking_key(shipment.po_number, shipment.tracking_numbers[0])) not in known]
+
+    @staticmethod
+    def group_shipments(shipments: list[Shipment]) -> list[Shipment]:
+        """
+        Merges the shipments of the same PO, so each PO gets a single fulfillment per run
+        """
+        grouped = {}
+        for shipment in shipments:
+            group = grouped.get(shipment.key)
+            if group is None:
+                grouped[shipment.key] = Shipment(shipment.supplier_code, shipment.po_number, shipment.carrier,
+                                                 list(shipment.tracking_numbers), dict(shipment.items),
+                                                 shipment.first_seen)
+                continue
+            group.carrier = group.carrier or shipment.carrier
+            group.tracking_numbers.extend(n for n in shipment.tracking_numbers if n not in group.tracking_numbers)
+            for part_id, quantity in shipment.items.items():
+                group.items[part_id] = group.items.get(part_id, 0) + quantity
+            if shipment.first_seen and (not group.first_seen or shipment.first_seen < group.first_seen):
+                group.first_seen = shipment.first_seen
+        return list(grouped.values())
+
+    @staticmethod
+    def gen_fulfillment(order: OpenOrder, shipment: Shipment) -> dict | None:
+        """
+        Fulfills only the line quantities the shipment items cover, matching the supplier part id to the line sku.
+        The order snapshot is updated, so other POs of the same order see what is left.
+        """
+        if not shipment.items:
+            logger.warning(f'Order {order.name} - PO {shipment.po_number} shipment has no item details')
+            return None
+        left = dict(shipment.items)
+        line_items_by_fo = []
+        for fo in order.fulfillment_orders:
+            lines = []
+            for line in fo['lineItems']['nodes']:
+                quantity = min(line['remainingQuantity'], left.get(line['sku'], 0))
+                if quantity > 0:
+                    lines.append({'id': line['id'], 'quantity': quantity})
+                    left[line['sku']] -= quantity
+                    line['remainingQuantity'] -= quantity
+            if lines:
+                line_items_by_fo.append({'fulfillmentOrderId': fo['id'], 'fulfillmentOrderLineItems': lines})
+        if not line_items_by_fo:
+            logger.warning(f'Order {order.name} - nothing left to fulfill for PO {shipment.po_number}')
+            return None
+        return {
+            'lineItemsByFulfillmentOrder': line_items_by_fo,
+            'notifyCustomer': settings.SHIPMENTS_NOTIFY_CUSTOMER,
+            'trackingInfo': {'company': shipment.carrier, 'numbers': shipment.tracking_numbers},
+        }
+
+    @staticmethod
+    def create_fulfillments(fulfillments: list[dict], batch_size: int = 10) -> list[int]:
+        """
+        Sends the fulfillments as aliased mutations, batch_size per GraphQL request. Returns the failed indexes
+        """
+        failed = []
+        for start in range(0, len(fulfillments), batch_size):
+            batch = fulfillments[start:start + batch_size]
+            args = ', '.join(f'$f{ix}: FulfillmentV2Input!' for ix in range(len(batch)))
+            mutations = '\n'.join(f'  f{ix}: fulfillmentCreateV2(fulfillment: $f{ix}) {{ fulfillment {{ id }} '
+                                  f'userErrors {{ field message }} }}' for ix in range(len(batch)))
+            query = f'mutation CreateFulfillments({args}) {{\n{mutations}\n}}'
+            try:
+                resp = execute_graphql(query, {f'f{ix}': fulfillment for ix, fulfillment in enumerate(batch)})
+            except Exception as e:  # noqa
+                logger.error(f'Error creating fulfillments: {e}')
+                resp = {}
+            if resp.get('errors'):
+                logger.error(f'Error creating fulfillments: {resp["errors"]}')
+            data = resp.get('data') or {}
+            for ix in range(len(batch)):
+                result = data.get(f'f{ix}')
+                if not result or result['userErrors'] or not result.get('fulfillment'):
+                    if result:
+                        logger.error(f'Error creating fulfillment: {result["userErrors"]}')
+                    failed.append(start + ix)
+        return failed
+
+    def load_state(self) -> dict[str, dict]:
+        """
+        Per supplier: since, the last successful poll, pending, the shipments to retry, and handled, when each
+        PO|tracking number was fulfilled
+        """
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path) as f:
+            state = json.load(f)
+        # the first version stored only the since timestamp per supplier
+        state = {k: v if isinstance(v, dict) else {'since': v, 'pending': []} for k, v in state.items()}
+        for supplier in state.values():
+            supplier.setdefault('handled', {})
+        return state
+
+    def save_state(self, state: dict[str, dict], unhandled: list[Shipment], handled: list[Shipment] = ()):
+        now = datetime.now(timezone.utc)
+        expires = (now - timedelta(days=settings.SHIPMENTS_PENDING_DAYS)).isoformat()
+        for supplier in state.values():
+            supplier['pending'] = []
+            supplier['handled'] = {k: v for k, v in supplier.get('handled', {}).items() if v >= expires}
+        for shipment in handled:
+            supplier = state.setdefault(shipment.supplier_code, {'since': None, 'pending': [], 'handled': {}})
+            for number in shipment.tracking_numbers:
+                supplier['handled'][tracking_key(shipment.po_number, number)] = now.isoformat()
+        for shipment in unhandled:
+            if shipment.first_seen and shipment.first_seen < expires:
+                logger.warning(f'{shipment.supplier_code} - dropping PO {shipment.po_number} shipment '
+                               f'{shipment.tracking_numbers}, unmatched since {shipment.first_seen}')
+                continue
+            supplier = state.setdefault(shipment.supplier_code, {'since': None, 'pending': [], 'handled': {}})
+            supplier['pending'].append(asdict(shipment))
+        with open(self.state_path, 'w') as f:
+            json.dump(state, f, indent=2)
+
+
+def tracking_key(po_number: str, tracking_number: str) -> str:
+    return f'{po_number}|{tracking_number}'
+
+
+@retry(stop=stop_after_attempt(5), wait=wait_fixed(2))
+def execute_graphql(query: str, variables: dict) -> dict:
+    resp = json.loads(shopify.GraphQL().execute(query, variables))
+    errors = resp.get('errors')
+    if isinstance(errors, list) and any((error.get('extensions') or {}).get('code') == 'THROTTLED' for error in errors):
+        raise Exception('Shopify GraphQL throttled')  # retried
+    return resp
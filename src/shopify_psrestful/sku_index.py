@@ -0,0 +1,110 @@
+import logging
+import sqlite3
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+from .metafields import get_supplier_and_product_id
+from .products import get_all_shopify_products
+
+from . import settings
+
+logger = logging.getLogger('shopify')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS variants (
+    variant_id INTEGER PRIMARY KEY,
+    shopify_product_id INTEGER NOT NULL,
+    supplier_code TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    sku TEXT,
+    inventory_item_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS variants_supplier_product ON variants (supplier_code, product_id);
+CREATE INDEX IF NOT EXISTS variants_shopify_product ON variants (shopify_product_id);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+'''
+
+
+class IndexedVariant(NamedTuple):
+    sku: str
+    inventory_item_id: int
+
+
+class SkuIndex:
+    """
+    Persistent supplier_code/product_id -> variant sku -> inventory_item_id mapping of the Shopify catalog.
+    Refreshes read only the products updated since the last crawl. Setting the psrestful metafields does not bump a
+    product's updated_at and deleted products never show up as updated, so the whole catalog is crawled again once
+    every SKU_INDEX_FULL_CRAWL_INTERVAL seconds, dropping the products it no longer finds.
+    """
+
+    def __init__(self, path: str = settings.SKU_INDEX_PATH,
+                 full_crawl_interval: int = settings.SKU_INDEX_FULL_CRAWL_INTERVAL):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self.full_crawl_interval = full_crawl_interval
+
+    def refresh(self, full: bool = False):
+        """
+        Must be called inside a Shopify session
+        """
+        started_at = datetime.now(timezone.utc)
+        full = full or self.is_full_crawl_due(started_at)
+        last_crawl = None if full else self.get_meta('last_crawl')
+        filters = {'updated_at_min': last_crawl} if last_crawl else {}
+        seen = set()
+        for product in get_all_shopify_products(**filters):
+            self.index_product(product)
+            seen.add(product.id)
+        if full:
+            self.prune(seen)
+            self.set_meta('last_full_crawl', started_at.isoformat(timespec='seconds'))
+        self.set_meta('last_crawl', started_at.isoformat(timespec='seconds'))
+        self.conn.commit()
+        logger.info(f'SKU index refreshed with {len(seen)} products updated since {last_crawl or "ever"}')
+
+    def is_full_crawl_due(self, now: datetime) -> bool:
+        last_full_crawl = self.get_meta('last_full_crawl')
+        if not last_full_crawl:
+            return True
+        return (now - datetime.fromisoformat(last_full_crawl)).total_seconds() > self.full_crawl_interval
+
+    def prune(self, shopify_ids: set[int]):
+        """
+        Removes the products a full crawl did not find, they were deleted in Shopify
+        """
+        indexed_ids = {row[0] for row in self.conn.execute('SELECT DISTINCT shopify_product_id FROM variants')}
+        deleted = [(product_id,) for product_id in indexed_ids - shopify_ids]
+        self.conn.executemany('DELETE FROM variants WHERE shopify_product_id = ?', deleted)
+        logger.info(f'SKU index pruned {len(deleted)} products deleted in Shopify')
+
+    def index_product(self, product):
+        self.conn.execute('DELETE FROM variants WHERE shopify_product_id = ?', (product.id,))
+        supplier_code, product_id = get_supplier_and_product_id(product)
+        if not supplier_code or not product_id:
+            logger.error(f'Product {product.title} has no supplier code or product id')
+            return
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO variants VALUES (?, ?, ?, ?, ?, ?)',
+            [(variant.id, product.id, supplier_code, product_id, variant.attributes['sku'], variant.inventory_item_id)
+             for variant in product.variants]
+        )
+
+    def products(self) -> dict[tuple[str, str], list[IndexedVariant]]:
+        ret = defaultdict(list)
+        rows = self.conn.execute('SELECT supplier_code, product_id, sku, inventory_item_id FROM variants '
+                                 'ORDER BY supplier_code, product_id')
+        for supplier_code, product_id, sku, inventory_item_id in rows:
+            ret[(supplier_code, product_id)].append(IndexedVariant(sku, inventory_item_id))
+        return ret
+
+    def get_meta(self, key: str) -> str | None:
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        self.conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, value))
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,117 @@
+import time
+
+import httpx
+import pytest
+
+from shopify_psrestful.cache import ResponseCache
+
+
+def response(content: bytes, headers: dict = None, status_code: int = 200) -> httpx.Response:
+    return httpx.Response(status_code, content=content, headers=headers,
+                          request=httpx.Request('GET', 'https://api.psrestful.com/'))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(path=str(tmp_path / 'cache.sqlite3'), max_bytes=1000,
+                         ttls={'products': 60, 'inventory': 0, 'default': 0})
+
+
+def test_gen_key_is_order_independent():
+    assert ResponseCache.gen_key('https://x/products/1', {'b': 2, 'a': 1}) == \
+        ResponseCache.gen_key('https://x/products/1', {'a': 1, 'b': 2})
+
+
+def test_get_ttl(cache):
+    assert cache.get_ttl('products') == 60
+    assert cache.get_ttl('order-shipment-notifications') == 0
+
+
+def test_fresh_and_stale(cache):
+    cache.put('k', response(b'{"a": 1}'), 60)
+    cached, fresh = cache.get('k', 60)
+    assert cached.content == b'{"a": 1}'
+    assert fresh
+    cached, fresh = cache.get('k', 0)
+    assert cached is not None
+    assert not fresh
+
+
+def test_not_cacheable(cache):
+    cache.put('no-ttl', response(b'{}'), 0)  # no TTL and nothing to revalidate with
+    cache.put('error', response(b'{}', status_code=500), 60)
+    assert cache.get('no-ttl', 60) == (None, False)
+    assert cache.get('error', 60) == (None, False)
+
+
+def test_revalidation(cache):
+    cache.put('k', response(b'{}', headers={'ETag': '"v1"', 'Last-Modified': 'Sat, 01 Jun 2024 00:00:00 GMT'}), 0)
+    cached, fresh = cache.get('k', 0)
+    assert not fresh
+    assert cache.conditional_headers(cached) == {'If-None-Match': '"v1"',
+                                                 'If-Modified-Since': 'Sat, 01 Jun 2024 00:00:00 GMT'}
+    cached.extensions['model'] = 'parsed'
+    cache.refresh('k')  # 304 Not Modified
+    again, fresh = cache.get('k', 60)
+    assert fresh
+    assert again is cached
+    assert again.extensions['model'] == 'parsed'
+
+
+def test_reloaded_from_disk(cache):
+    cache.put('k', response(b'{"a": 1}', headers={'ETag': '"v1"'}), 60)
+    cache.memory.clear()
+    cached, fresh = cache.get('k', 60)
+    assert fresh
+    assert cached.content == b'{"a": 1}'
+    assert cached.headers['etag'] == '"v1"'
+    assert 'model' not in cached.extensions
+
+
+def test_lru_eviction(cache):
+    cache.put('a', response(b'a' * 400), 60)
+    time.sleep(0.01)
+    cache.put('b', response(b'b' * 400), 60)
+    time.sleep(0.01)
+    cache.get('a', 60)  # a is now more recently used than b
+    time.sleep(0.01)
+    cache.put('c', response(b'c' * 400), 60)
+    assert cache.get('b', 60) == (None, False)
+    assert cache.get('a', 60)[0] is not None
+    assert cache.get('c', 60)[0] is not None
+    assert 'b' not in cache.memory
+
+
+def accessed_at(cache, key):
+    return cache.conn.execute('SELECT accessed_at FROM responses WHERE key = ?', (key,)).fetchone()[0]
+
+
+def test_memory_hits_are_flushed_in_batches(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / 'cache.sqlite3'), ttls={}, flush_every=3)
+    for key in 'abc':
+        cache.put(key, response(key.encode()), 60)
+    stored = accessed_at(cache, 'a')
+    time.sleep(0.01)
+    cache.get('a', 60)
+    cache.get('b', 60)
+    cache.get('a', 60)
+    assert accessed_at(cache, 'a') == stored  # nothing written yet
+    cache.get('c', 60)
+    assert accessed_at(cache, 'a') > stored
+    assert cache.accessed == {}
+
+
+def test_refresh_survives_memory_eviction(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = ResponseCache(path=path, ttls={})
+    cache.put('k', response(b'{}', headers={'ETag': '"v1"'}), 0)
+    time.sleep(0.01)
+    cache.refresh('k')  # 304 Not Modified, pending until the next flush
+    refreshed_at = cache.refreshed['k']
+    cache.memory.clear()
+    cached, fresh = cache.get('k', 60)
+    assert fresh
+    assert cached.extensions['stored_at'] == refreshed_at
+    cache.close()
+    cached, fresh = ResponseCache(path=path, ttls={}).get('k', 60)
+    assert cached.extensions['stored_at'] == refreshed_at
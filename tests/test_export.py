@@ -0,0 +1,83 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from shopify_psrestful.export import CatalogExporter, JsonLinesWriter
+
+
+def read_lines(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_json_lines_writer_chunks(tmp_path):
+    path = str(tmp_path / 'rows.jsonl.gz')
+    with JsonLinesWriter(path, chunk_size=2) as writer:
+        for ix in range(3):
+            writer.write(json.dumps({'ix': ix}))
+            assert len(writer.buffer) == (ix + 1) % 2  # flushed every 2 lines
+    assert writer.count == 3
+    assert read_lines(path) == [{'ix': 0}, {'ix': 1}, {'ix': 2}]
+
+
+class Response:
+    def __init__(self, data: dict, is_ok: bool = True):
+        self.data = data
+        self.is_ok = is_ok
+
+    def model_dump(self, mode='json', exclude_none=True):
+        return self.data
+
+
+class Client:
+    """
+    Stands for PSClient: SUP has two products, P2 without inventory, and BROKEN fails
+    """
+
+    def get_products(self, supplier_code, category, product_ids, max_products=200):
+        if supplier_code == 'BROKEN':
+            raise Exception('No product version found for supplier BROKEN')
+        products = [
+            {'Product': {'productId': 'P1', 'ProductPartArray': {'ProductPart': [{'partId': 'P1-S'},
+                                                                                 {'partId': 'P1-M'}]}}},
+            {'Product': {'productId': 'P2'}},
+        ]
+        for ix, product in enumerate(products):
+            if ix >= max_products:
+                break
+            yield Response(product)
+
+    def get_inventory(self, supplier_code, product_id):
+        return Response({'Inventory': {'productId': product_id}}, is_ok=product_id == 'P1')
+
+
+@pytest.fixture
+def exporter(tmp_path):
+    return CatalogExporter(output_dir=str(tmp_path), client=Client())
+
+
+def test_partition_layout(exporter, tmp_path):
+    paths = exporter.export(['SUP', 'BROKEN'])
+    assert len(paths) == 1
+    path = paths[0]
+    assert os.path.dirname(path) == str(tmp_path / 'supplier=SUP')
+    assert os.path.basename(path).startswith('run=')
+    assert sorted(os.listdir(path)) == ['inventory.jsonl.gz', 'parts.jsonl.gz', 'products.jsonl.gz']
+    assert [p['Product']['productId'] for p in read_lines(os.path.join(path, 'products.jsonl.gz'))] == ['P1', 'P2']
+    assert read_lines(os.path.join(path, 'parts.jsonl.gz')) == [
+        {'supplier_code': 'SUP', 'product_id': 'P1', 'partId': 'P1-S'},
+        {'supplier_code': 'SUP', 'product_id': 'P1', 'partId': 'P1-M'},
+    ]
+    assert read_lines(os.path.join(path, 'inventory.jsonl.gz')) == [
+        {'supplier_code': 'SUP', 'product_id': 'P1', 'Inventory': {'productId': 'P1'}},
+    ]
+    # the failed supplier leaves no snapshot behind, finished or not
+    assert os.listdir(tmp_path / 'supplier=BROKEN') == []
+    assert not [name for name in os.listdir(tmp_path / 'supplier=SUP') if name.startswith('.')]
+
+
+def test_max_products_zero(exporter):
+    path = exporter.export(['SUP'], max_products=0)[0]
+    assert read_lines(os.path.join(path, 'products.jsonl.gz')) == []
@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+import pytest
+
+from shopify_psrestful import settings
+from shopify_psrestful.fingerprints import FingerprintStore, product_fingerprint
+
+
+class Product:
+    """
+    Stands for ProductResponseV100/V200, only what fingerprinting uses
+    """
+
+    def __init__(self, product_id: str, **fields):
+        self.fields = {'productId': product_id, **fields}
+        self.data = SimpleNamespace(productId=product_id)
+
+    def model_dump(self, mode='json', exclude_none=True):
+        return {'Product': {k: v for k, v in self.fields.items() if v is not None or not exclude_none},
+                'ServiceMessageArray': None}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FingerprintStore(path=str(tmp_path / 'fingerprints.sqlite3'))
+
+
+def test_fingerprint_is_stable():
+    first = Product('P1', productName='Tee', description=['Soft', 'Cotton'])
+    second = Product('P1', description=['Soft', 'Cotton'], productName='Tee')
+    assert product_fingerprint(first) == product_fingerprint(second)
+
+
+def test_fingerprint_ignores_volatile_fields():
+    assert product_fingerprint(Product('P1', productName='Tee', lastChangeDate='2024-06-01')) == \
+        product_fingerprint(Product('P1', productName='Tee', lastChangeDate='2024-06-02'))
+
+
+def test_fingerprint_changes_with_content():
+    assert product_fingerprint(Product('P1', productName='Tee')) != \
+        product_fingerprint(Product('P1', productName='Hat'))
+
+
+def test_only_changed(store):
+    products = [Product('P1', productName='Tee'), Product('P2', productName='Hat')]
+    changed = list(store.only_changed(products, 'SUP', store='shop.myshopify.com'))
+    assert [product for product, _ in changed] == products
+    for product, fingerprint in changed:
+        store.save('SUP', product.data.productId, fingerprint, store='shop.myshopify.com')
+
+    products = [Product('P1', productName='Tee'), Product('P2', productName='Cap')]
+    changed = list(store.only_changed(products, 'SUP', store='shop.myshopify.com'))
+    assert [product for product, _ in changed] == [products[1]]
+    # fingerprints are per store
+    assert len(list(store.only_changed(products, 'SUP', store='other.myshopify.com'))) == 2
+
+
+def test_store_defaults_to_shop_url(store, monkeypatch):
+    monkeypatch.setattr(settings, 'SHOPIFY_APP_SHOP_URL', 'shop.myshopify.com')
+    store.save('SUP', 'P1', 'abc')
+    assert store.get('SUP', 'P1', store='shop.myshopify.com') == 'abc'
+    monkeypatch.setattr(settings, 'SHOPIFY_APP_SHOP_URL', None)
+    with pytest.raises(ValueError):
+        store.save('SUP', 'P1', 'abc')
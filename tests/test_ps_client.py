@@ -0,0 +1,70 @@
+import httpx
+import pytest
+
+from shopify_psrestful.cache import ResponseCache
+from shopify_psrestful.domain import APIParams, Environment, Function, ServiceCode, ServiceVersion
+from shopify_psrestful.ps_client import APIHelper
+
+
+@pytest.fixture
+def api(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / 'cache.sqlite3'), ttls={'products': 60, 'inventory': 0})
+    api = APIHelper(sync=True, cache=cache)
+    api.requests = []
+    api.etag = '"v1"'
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        api.requests.append(request)
+        if request.headers.get('if-none-match') == api.etag:
+            return httpx.Response(304)
+        return httpx.Response(200, json={'requests': len(api.requests)}, headers={'ETag': api.etag})
+
+    api.client = httpx.Client(transport=httpx.MockTransport(handler))
+    return api
+
+
+def params(service=ServiceCode.INV, function=Function.GetInventoryLevels, max_age=None):
+    return APIParams(environment=Environment.PROD, supplier_code='SUP', service=service, version=ServiceVersion.V_2_0_0,
+                     function=function, max_age=max_age)
+
+
+def test_fresh_response_skips_request(api):
+    product = params(ServiceCode.Product, Function.GetProduct)
+    first, _ = api.perform_request(product, product_id='P1')
+    second, _ = api.perform_request(product, product_id='P1')
+    assert len(api.requests) == 1
+    assert second is first
+
+
+def test_max_age_forces_revalidation(api):
+    product = params(ServiceCode.Product, Function.GetProduct, max_age=0)
+    api.perform_request(product, product_id='P1')
+    api.perform_request(product, product_id='P1')
+    assert len(api.requests) == 2
+    assert api.requests[1].headers['if-none-match'] == '"v1"'
+
+
+def test_not_modified_reuses_cached_response(api):
+    first, _ = api.perform_request(params(), product_id='P1')
+    second, _ = api.perform_request(params(), product_id='P1')
+    assert len(api.requests) == 2
+    assert api.requests[1].headers['if-none-match'] == '"v1"'
+    assert second is first
+    assert second.json() == {'requests': 1}
+
+
+def test_modified_replaces_cached_response(api):
+    api.perform_request(params(), product_id='P1')
+    api.etag = '"v2"'
+    response, _ = api.perform_request(params(), product_id='P1')
+    assert response.json() == {'requests': 2}
+    assert response.headers['etag'] == '"v2"'
+
+
+def test_excluded_endpoint_is_not_cached(api):
+    osn = params(ServiceCode.OSN, Function.GetOrderShipmentNotification)
+    api.perform_request(osn)
+    api.perform_request(osn)
+    assert len(api.requests) == 2
+    assert 'if-none-match' not in api.requests[1].headers
+    assert api.cache.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0] == 0
@@ -0,0 +1,117 @@
+import json
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from shopify_psrestful.scheduler import InventoryScheduler, RefreshState
+
+
+@pytest.fixture
+def scheduler():
+    return InventoryScheduler(min_interval=300, max_interval=86400, initial_interval=3600, low_stock=50,
+                              service=object())
+
+
+def test_next_interval_falling_low_stock_refreshes_at_min_interval(scheduler):
+    state = RefreshState('SUP', 'P1', interval=7200, levels={'A': 40, 'B': 20})
+    assert scheduler.next_interval(state, {'A': 30, 'B': 10}) == 300
+
+
+def test_next_interval_sold_out_variant_backs_off(scheduler):
+    state = RefreshState('SUP', 'P1', interval=3600, levels={'A': 500, 'B': 0})
+    assert scheduler.next_interval(state, {'A': 500, 'B': 0}) == 5400
+
+
+def test_next_interval_sold_out_product_backs_off(scheduler):
+    state = RefreshState('SUP', 'P1', interval=3600, levels={'A': 0, 'B': 0})
+    assert scheduler.next_interval(state, {'A': 0, 'B': 0}) == 5400
+
+
+def test_next_interval_first_refresh_keeps_interval(scheduler):
+    state = RefreshState('SUP', 'P1', interval=3600)
+    assert scheduler.next_interval(state, {'A': 100}) == 3600
+
+
+def test_next_interval_changed_halves(scheduler):
+    state = RefreshState('SUP', 'P1', interval=3600, levels={'A': 100})
+    assert scheduler.next_interval(state, {'A': 90}) == 1800
+
+
+def test_next_interval_unchanged_grows(scheduler):
+    state = RefreshState('SUP', 'P1', interval=3600, levels={'A': 100})
+    assert scheduler.next_interval(state, {'A': 100}) == 5400
+
+
+def test_next_interval_is_clamped(scheduler):
+    state = RefreshState('SUP', 'P1', interval=400, levels={'A': 100})
+    assert scheduler.next_interval(state, {'A': 90}) == 300
+    state = RefreshState('SUP', 'P1', interval=80000, levels={'A': 100})
+    assert scheduler.next_interval(state, {'A': 100}) == 86400
+
+
+def add_state(scheduler, product_id, due):
+    state = RefreshState('SUP', product_id)
+    scheduler.states[state.key] = state
+    scheduler.schedule(state, due)
+    return state
+
+
+def test_next_due_skips_rescheduled_entries(scheduler):
+    now = time.monotonic()
+    first = add_state(scheduler, 'P1', now + 3600)
+    second = add_state(scheduler, 'P2', now - 2)
+    scheduler.schedule(first, now - 1)  # ad-hoc refresh, the entry due in an hour is stale
+    assert scheduler.next_due() is second
+    assert scheduler.next_due() is first
+    assert len(scheduler.queue) == 1  # the stale entry, dropped once it reaches the top
+    scheduler.stop()
+    assert scheduler.next_due() is None
+
+
+def test_next_due_skips_removed_keys(scheduler):
+    now = time.monotonic()
+    removed = add_state(scheduler, 'P1', now - 2)
+    kept = add_state(scheduler, 'P2', now - 1)
+    del scheduler.states[removed.key]
+    assert scheduler.next_due() is kept
+
+
+def test_next_due_waits_until_due(scheduler):
+    state = add_state(scheduler, 'P1', time.monotonic() + 0.2)
+    ts = time.monotonic()
+    assert scheduler.next_due() is state
+    assert time.monotonic() - ts >= 0.15
+
+
+def test_request_refresh(scheduler):
+    state = add_state(scheduler, 'P1', time.monotonic() + 3600)
+    assert scheduler.request_refresh('SUP', 'P1')
+    assert state.due <= time.monotonic()
+    assert not scheduler.request_refresh('SUP', 'unknown')
+
+
+def post(port, path, body: bytes = b''):
+    request = urllib.request.Request(f'http://127.0.0.1:{port}{path}', data=body, method='POST')
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_refresh_endpoint(scheduler):
+    add_state(scheduler, 'P1', time.monotonic() + 3600)
+    server = scheduler.start_server('127.0.0.1', 0)
+    port = server.server_address[1]
+    try:
+        assert post(port, '/refresh?supplier_code=SUP&product_id=P1')[0] == 202
+        assert post(port, '/refresh', json.dumps({'supplier_code': 'SUP', 'product_id': 'P1'}).encode())[0] == 202
+        assert post(port, '/refresh', b'not json')[0] == 400
+        assert post(port, '/refresh', b'[1, 2]')[0] == 400
+        assert post(port, '/refresh?supplier_code=SUP')[0] == 400
+        assert post(port, '/refresh?supplier_code=SUP&product_id=P2')[0] == 404
+        assert post(port, '/other')[0] == 404
+    finally:
+        server.shutdown()
@@ -0,0 +1,153 @@
+import asyncio
+import json
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from shopify_psrestful import settings
+from shopify_psrestful.shipments import OpenOrder, Shipment, ShipmentSync
+
+
+def package(tracking_number, items, carrier='UPS'):
+    return {'trackingNumber': tracking_number, 'carrier': carrier,
+            'ItemArray': {'Item': [{'supplierPartId': part_id, 'quantity': str(qty)} for part_id, qty in items]}}
+
+
+def osn_response(*notifications):
+    return {'OrderShipmentNotificationArray': {'OrderShipmentNotification': [
+        {'purchaseOrderNumber': po_number,
+         'SalesOrderArray': {'SalesOrder': [{'ShipmentLocationArray': {'ShipmentLocation': [
+             {'PackageArray': {'Package': packages}}]}}]}}
+        for po_number, packages in notifications
+    ]}}
+
+
+def open_order(purchase_orders, lines):
+    nodes = [{'id': f'gid://shopify/FulfillmentOrderLineItem/{sku}', 'sku': sku, 'remainingQuantity': qty}
+             for sku, qty in lines]
+    return OpenOrder('gid://shopify/Order/1', '#1001', purchase_orders,
+                     [{'id': 'gid://shopify/FulfillmentOrder/1', 'status': 'OPEN', 'lineItems': {'nodes': nodes}}])
+
+
+def test_gen_shipments():
+    resp = osn_response(
+        ('PO1', [package('1Z1', [('A', 2), ('B', 1)]), package('1Z2', [('A', 1)])]),
+        ('PO2', [package(None, [('C', 1)])]),  # no tracking, skipped
+    )
+    shipments = ShipmentSync.gen_shipments('SUP', resp, '2024-06-01T00:00:00+00:00')
+    assert shipments == [
+        Shipment('SUP', 'PO1', 'UPS', ['1Z1'], {'A': 2, 'B': 1}, '2024-06-01T00:00:00+00:00'),
+        Shipment('SUP', 'PO1', 'UPS', ['1Z2'], {'A': 1}, '2024-06-01T00:00:00+00:00'),
+    ]
+
+
+def test_gen_shipments_error():
+    assert ShipmentSync.gen_shipments('SUP', {'ServiceMessageArray': [{'code': 999}]}) == []
+
+
+def test_group_shipments():
+    shipments = ShipmentSync.group_shipments([
+        Shipment('SUP', 'PO1', None, ['1Z1'], {'A': 1}, '2024-06-02'),
+        Shipment('SUP', 'PO1', 'UPS', ['1Z1', '1Z2'], {'A': 1, 'B': 2}, '2024-06-01'),
+        Shipment('SUP', 'PO2', 'FedEx', ['F1'], {'C': 1}, '2024-06-02'),
+    ])
+    assert shipments == [
+        Shipment('SUP', 'PO1', 'UPS', ['1Z1', '1Z2'], {'A': 2, 'B': 2}, '2024-06-01'),
+        Shipment('SUP', 'PO2', 'FedEx', ['F1'], {'C': 1}, '2024-06-02'),
+    ]
+
+
+def test_gen_fulfillment_covers_only_shipped_quantities():
+    order = open_order({'SUP': 'PO1'}, [('A', 5), ('B', 2)])
+    fulfillment = ShipmentSync.gen_fulfillment(order, Shipment('SUP', 'PO1', 'UPS', ['1Z1'], {'A': 3}))
+    assert fulfillment['lineItemsByFulfillmentOrder'] == [{
+        'fulfillmentOrderId': 'gid://shopify/FulfillmentOrder/1',
+        'fulfillmentOrderLineItems': [{'id': 'gid://shopify/FulfillmentOrderLineItem/A', 'quantity': 3}],
+    }]
+    assert fulfillment['trackingInfo'] == {'company': 'UPS', 'numbers': ['1Z1']}
+    # the snapshot is updated, the next shipment only gets what is left
+    fulfillment = ShipmentSync.gen_fulfillment(order, Shipment('SUP', 'PO1', 'UPS', ['1Z2'], {'A': 5, 'B': 2}))
+    assert fulfillment['lineItemsByFulfillmentOrder'][0]['fulfillmentOrderLineItems'] == [
+        {'id': 'gid://shopify/FulfillmentOrderLineItem/A', 'quantity': 2},
+        {'id': 'gid://shopify/FulfillmentOrderLineItem/B', 'quantity': 2},
+    ]
+    assert ShipmentSync.gen_fulfillment(order, Shipment('SUP', 'PO1', 'UPS', ['1Z3'], {'A': 1})) is None
+
+
+def test_gen_fulfillment_without_items():
+    order = open_order({'SUP': 'PO1'}, [('A', 5)])
+    assert ShipmentSync.gen_fulfillment(order, Shipment('SUP', 'PO1', 'UPS', ['1Z1'])) is None
+
+
+@pytest.fixture
+def sync(tmp_path):
+    return ShipmentSync(state_path=str(tmp_path / 'shipments.json'))
+
+
+def test_fulfill_returns_unmatched_and_failed(sync, monkeypatch):
+    order = open_order({'SUP': 'PO1', 'OTHER': 'PO2'}, [('A', 1), ('B', 1)])
+    written = Shipment('SUP', 'PO1', 'UPS', ['1Z1'], {'A': 1})
+    failed = Shipment('OTHER', 'PO2', 'UPS', ['1Z2'], {'B': 1})
+    unmatched = Shipment('SUP', 'PO9', 'UPS', ['1Z3'], {'A': 1})
+    monkeypatch.setattr(ShipmentSync, 'create_fulfillments', staticmethod(lambda fulfillments: [1]))
+    unhandled = sync.fulfill([written, failed, unmatched], {('SUP', 'PO1'): order, ('OTHER', 'PO2'): order})
+    assert unhandled == [unmatched, failed]
+
+
+def test_drop_known():
+    state = {'SUP': {'since': None, 'handled': {'PO1|1Z1': '2024-06-01T00:00:00+00:00'},
+                     'pending': [asdict(Shipment('SUP', 'PO2', 'UPS', ['1Z2', '1Z3'], {'A': 1}))]}}
+    shipments = [
+        Shipment('SUP', 'PO1', 'UPS', ['1Z1'], {'A': 1}),  # already fulfilled
+        Shipment('SUP', 'PO2', 'UPS', ['1Z3'], {'A': 1}),  # already pending
+        Shipment('SUP', 'PO1', 'UPS', ['1Z4'], {'A': 1}),
+        Shipment('OTHER', 'PO1', 'UPS', ['1Z1'], {'A': 1}),
+    ]
+    assert ShipmentSync.drop_known(shipments, state) == shipments[2:]
+
+
+def test_state_records_handled(sync):
+    old = (datetime.now(timezone.utc) - timedelta(days=100)).isoformat()
+    state = {'SUP': {'since': None, 'pending': [], 'handled': {'PO0|1Z0': old}}}
+    sync.save_state(state, [], [Shipment('SUP', 'PO1', 'UPS', ['1Z1', '1Z2'], {'A': 1})])
+    assert sorted(sync.load_state()['SUP']['handled']) == ['PO1|1Z1', 'PO1|1Z2']
+
+
+def test_state_keeps_pending_until_expired(sync):
+    now = datetime.now(timezone.utc)
+    recent = Shipment('SUP', 'PO1', 'UPS', ['1Z1'], {'A': 1}, now.isoformat())
+    expired = Shipment('SUP', 'PO2', 'UPS', ['1Z2'], {'A': 1}, (now - timedelta(days=100)).isoformat())
+    sync.save_state({'SUP': {'since': '2024-06-01T00:00:00+00:00', 'pending': []}}, [recent, expired])
+    state = sync.load_state()
+    assert state['SUP']['since'] == '2024-06-01T00:00:00+00:00'
+    assert [Shipment(**pending) for pending in state['SUP']['pending']] == [recent]
+
+
+def test_load_state_first_version(sync):
+    with open(sync.state_path, 'w') as f:
+        json.dump({'SUP': '2024-06-01T00:00:00+00:00'}, f)
+    assert sync.load_state() == {'SUP': {'since': '2024-06-01T00:00:00+00:00', 'pending': [], 'handled': {}}}
+
+
+def test_poll_supplier_looks_back(sync, monkeypatch):
+    calls = []
+
+    class API:
+        @staticmethod
+        def get_latest_osn_version(supplier_code, version):
+            return '1.0.0'
+
+        @staticmethod
+        async def a_get_order_shipment_notifications(supplier_code, environment, headers, query_params, version):
+            calls.append(query_params)
+            return SimpleNamespace(status_code=200, json=lambda: osn_response(('PO1', [package('1Z1', [('A', 1)])]))), \
+                0, version
+
+    sync.api = API()
+    monkeypatch.setattr(settings, 'SHIPMENTS_LOOKBACK_HOURS', 72)
+    polled_at, shipments = asyncio.run(sync.poll_supplier('SUP', {'SUP': {'since': '2024-06-10T00:00:00+00:00'}}))
+    assert calls[0]['shipmentDateTimeStamp'] == '2024-06-07T00:00:00+00:00'
+    assert [shipment.tracking_numbers for shipment in shipments] == [['1Z1']]
+    assert shipments[0].first_seen == polled_at
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from shopify_psrestful import sku_index
+from shopify_psrestful.sku_index import IndexedVariant, SkuIndex
+
+
+def product(product_id, supplier_code, ps_product_id, *skus):
+    variants = [SimpleNamespace(id=product_id * 100 + ix, attributes={'sku': sku},
+                                inventory_item_id=product_id * 1000 + ix) for ix, sku in enumerate(skus)]
+    return SimpleNamespace(id=product_id, title=f'Product {product_id}', variants=variants,
+                           metafields=(supplier_code, ps_product_id))
+
+
+class Shopify:
+    """
+    Catalog served to the index, records the filters of every crawl
+    """
+
+    def __init__(self, *products):
+        self.products = list(products)
+        self.crawls = []
+
+    def get_all_products(self, **filters):
+        self.crawls.append(filters)
+        return list(self.products)
+
+
+@pytest.fixture
+def shopify(monkeypatch):
+    shopify = Shopify()
+    monkeypatch.setattr(sku_index, 'get_all_shopify_products', shopify.get_all_products)
+    monkeypatch.setattr(sku_index, 'get_supplier_and_product_id', lambda p: p.metafields)
+    return shopify
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SkuIndex(path=str(tmp_path / 'sku_index.sqlite3'), full_crawl_interval=3600)
+
+
+def test_index_product(index, shopify):
+    index.index_product(product(1, 'SUP', 'P1', 'A', 'B'))
+    index.index_product(product(2, None, None, 'C'))  # not tagged, skipped
+    assert index.products() == {('SUP', 'P1'): [IndexedVariant('A', 1000), IndexedVariant('B', 1001)]}
+
+
+def test_index_product_replaces_variants(index, shopify):
+    index.index_product(product(1, 'SUP', 'P1', 'A', 'B'))
+    index.index_product(product(1, 'SUP', 'P2', 'C'))
+    assert index.products() == {('SUP', 'P2'): [IndexedVariant('C', 1000)]}
+    index.index_product(product(1, None, None, 'C'))  # metafields removed
+    assert index.products() == {}
+
+
+def test_refresh_is_incremental(index, shopify):
+    shopify.products = [product(1, 'SUP', 'P1', 'A')]
+    index.refresh()
+    assert shopify.crawls == [{}]
+    last_crawl = index.get_meta('last_crawl')
+    index.refresh()
+    assert shopify.crawls[1] == {'updated_at_min': last_crawl}
+    shopify.products = []  # nothing updated, incremental refreshes do not prune
+    index.refresh()
+    assert index.products() == {('SUP', 'P1'): [IndexedVariant('A', 1000)]}
+
+
+def test_full_crawl_prunes_deleted_products(index, shopify):
+    shopify.products = [product(1, 'SUP', 'P1', 'A'), product(2, 'SUP', 'P2', 'B')]
+    index.refresh()
+    shopify.products = [product(2, 'SUP', 'P2', 'B')]
+    index.refresh(full=True)
+    assert shopify.crawls[-1] == {}
+    assert list(index.products()) == [('SUP', 'P2')]
+
+
+def test_full_crawl_is_scheduled(index, shopify):
+    index.refresh()
+    index.refresh()
+    assert shopify.crawls[-1] != {}
+    last_full_crawl = datetime.now(timezone.utc) - timedelta(seconds=3601)
+    index.set_meta('last_full_crawl', last_full_crawl.isoformat(timespec='seconds'))
+    index.refresh()
+    assert shopify.crawls[-1] == {}
+    assert not index.is_full_crawl_due(datetime.now(timezone.utc))